@@ -1,30 +1,66 @@
+import orjson
 import requests
-import os
+import urllib3
+from requests.adapters import HTTPAdapter
 import logging
-from typing import Dict, List, Optional, Any
-from dotenv import load_dotenv
-
-# Load secrets from .env file
-load_dotenv()
+import threading
+from cachetools import TTLCache
+from typing import Callable, Dict, List, Optional, Any, Iterator
+from config import AIRFLOW_URL, AIRFLOW_USERNAME, AIRFLOW_PASSWORD, AF_CACHE_TTL
 
 # Setup helper logger
 logger = logging.getLogger("AirflowClient")
 
+# Marker for "not in the cache" (None can be a real cached value)
+_MISSING = object()
+
 class AirflowClient:
     """
     This class handles talking to the Apache Airflow Web API.
     It's like a remote control for Airflow.
     """
+    __slots__ = (
+        "base_url", "username", "password", "auth", "headers", "session",
+        "_dag_run_cache", "_dag_run_cache_lock"
+    )
+
     def __init__(self):
         # 1. Load Settings
-        self.base_url = os.getenv("AIRFLOW_URL", "http://localhost:8080").rstrip('/')
-        self.username = os.getenv("AIRFLOW_USERNAME", "admin")
-        self.password = os.getenv("AIRFLOW_PASSWORD", "admin")
+        self.base_url = AIRFLOW_URL
+        self.username = AIRFLOW_USERNAME
+        self.password = AIRFLOW_PASSWORD
         
         # 2. Setup Authentication (Basic Auth)
         self.auth = (self.username, self.password)
         self.headers = {"Content-Type": "application/json"}
 
+        # 3. Setup a reusable Session (keeps the connection open between calls)
+        self.session = requests.Session()
+        self.session.auth = self.auth
+        self.session.headers.update(self.headers)
+        # Retry busy/unavailable errors (429/5xx) with exponential backoff + jitter.
+        # Only GETs are retried: a 504 can arrive AFTER a POST was accepted, and
+        # repeating it would start a second run.
+        retry = urllib3.util.Retry(
+            total=5,
+            backoff_factor=0.3,
+            backoff_jitter=0.3,
+            status_forcelist=[429, 502, 503, 504],
+            allowed_methods=["GET"],
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # 4. Short-lived cache for run info (avoids asking Airflow the same thing twice in a row)
+        self._dag_run_cache = TTLCache(maxsize=256, ttl=AF_CACHE_TTL)
+        self._dag_run_cache_lock = threading.Lock()
+
+    def close(self):
+        """Closes the open connections."""
+        self.session.close()
+
     def _get(self, endpoint: str) -> Dict[str, Any]:
         """
         Helper: Makes a GET request to Airflow.
@@ -32,30 +68,50 @@ class AirflowClient:
         url = f"{self.base_url}/api/v1/{endpoint}"
         try:
             logger.debug(f"GET {url}")
-            response = requests.get(url, auth=self.auth, headers=self.headers, timeout=10)
+            response = self.session.get(url, timeout=10)
             response.raise_for_status() # Raise error if status is 4xx or 5xx
-            return response.json()
+            return orjson.loads(response.content)
         except requests.exceptions.RequestException as e:
             logger.error(f"Airflow API Error: {str(e)}")
             raise
 
+    def _cached(self, key: tuple, fetch: Callable[[], Any]) -> Any:
+        """
+        Helper: Returns the cached answer for 'key' if it's still fresh,
+        otherwise calls 'fetch()' and remembers the result.
+        """
+        with self._dag_run_cache_lock:
+            value = self._dag_run_cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = fetch()
+            with self._dag_run_cache_lock:
+                self._dag_run_cache[key] = value
+        return value
+
     def get_dag_run(self, dag_id: str, dag_run_id: str) -> Dict[str, Any]:
         """
         Get info about a specific run of a pipeline.
         Example: status (success/failed), start_date, etc.
         """
-        return self._get(f"dags/{dag_id}/dagRuns/{dag_run_id}")
+        return self._cached(
+            (dag_id, dag_run_id, "dr"),
+            lambda: self._get(f"dags/{dag_id}/dagRuns/{dag_run_id}")
+        )
 
     def get_failed_tasks(self, dag_id: str, dag_run_id: str) -> List[Dict[str, Any]]:
         """
         Finds all tasks that broke in a specific run.
         """
-        # Get all task instances (TIs)
-        data = self._get(f"dags/{dag_id}/dagRuns/{dag_run_id}/taskInstances")
-        tasks = data.get("task_instances", [])
-        
-        # Filter for only 'failed' ones
-        failed = [t for t in tasks if t["state"] == "failed"]
+        return self._cached(
+            (dag_id, dag_run_id, "ft"),
+            lambda: self._fetch_failed_tasks(dag_id, dag_run_id)
+        )
+
+    def _fetch_failed_tasks(self, dag_id: str, dag_run_id: str) -> List[Dict[str, Any]]:
+        """Helper: Asks Airflow (no cache) for the failed tasks of a run."""
+        # Ask Airflow for only the 'failed' task instances (TIs)
+        data = self._get(f"dags/{dag_id}/dagRuns/{dag_run_id}/taskInstances?state=failed")
+        failed = data.get("task_instances", [])
         logger.info(f"Found {len(failed)} failed tasks for {dag_id} run {dag_run_id}")
         return failed
 
@@ -67,7 +123,7 @@ class AirflowClient:
         url = f"{self.base_url}/api/v1/dags/{dag_id}/dagRuns/{dag_run_id}/taskInstances/{task_id}/logs/{try_number}"
         try:
             logger.debug(f"Fetching logs from {url}")
-            response = requests.get(url, auth=self.auth, headers=self.headers, timeout=30)
+            response = self.session.get(url, timeout=30)
             
             if response.status_code == 404:
                 return "Log not found."
@@ -78,6 +134,34 @@ class AirflowClient:
             logger.error(f"Failed to fetch logs: {e}")
             return f"Error fetching logs: {str(e)}"
 
+    def get_task_log_stream(self, dag_id: str, dag_run_id: str, task_id: str, try_number: int) -> Iterator[str]:
+        """
+        Same as get_task_log, but gives the log back in pieces while it downloads.
+        If the caller stops reading early, the rest of the log is never downloaded.
+        If the download breaks half-way, the error is raised (a message
+        can't be mixed into a log that's already been partly handed out).
+        """
+        url = f"{self.base_url}/api/v1/dags/{dag_id}/dagRuns/{dag_run_id}/taskInstances/{task_id}/logs/{try_number}"
+        started = False
+        try:
+            logger.debug(f"Streaming logs from {url}")
+            with self.session.get(url, stream=True, timeout=30) as response:
+                if response.status_code == 404:
+                    yield "Log not found."
+                    return
+
+                response.raise_for_status()
+                if response.encoding is None:
+                    response.encoding = "utf-8"
+                for chunk in response.iter_content(chunk_size=64 * 1024, decode_unicode=True):
+                    started = True
+                    yield chunk
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to stream logs: {e}")
+            if started:
+                raise
+            yield f"Error fetching logs: {str(e)}"
+
     def trigger_dag_run(self, dag_id: str, conf: Dict = None) -> Dict:
         """
         Remote Button Press: Starts a DAG run.
@@ -86,9 +170,12 @@ class AirflowClient:
         url = f"{self.base_url}/api/v1/dags/{dag_id}/dagRuns"
         payload = {"conf": conf or {}}
         try:
-            response = requests.post(url, json=payload, auth=self.auth, headers=self.headers)
+            response = self.session.post(url, json=payload)
             response.raise_for_status()
-            return response.json()
+            # A new run was started, so cached run info may be out of date
+            with self._dag_run_cache_lock:
+                self._dag_run_cache.clear()
+            return orjson.loads(response.content)
         except Exception as e:
             logger.error(f"Failed to trigger DAG {dag_id}: {e}")
             raise
@@ -0,0 +1,27 @@
+import os
+from dotenv import load_dotenv
+
+# ==============================================================================
+# SETTINGS
+# Reads the .env file ONCE and keeps every setting here.
+# The other files import what they need from this module.
+# ==============================================================================
+load_dotenv()
+
+# Airflow
+AIRFLOW_URL = os.getenv("AIRFLOW_URL", "http://localhost:8080").rstrip('/')
+AIRFLOW_USERNAME = os.getenv("AIRFLOW_USERNAME", "admin")
+AIRFLOW_PASSWORD = os.getenv("AIRFLOW_PASSWORD", "admin")
+AF_CACHE_TTL = int(os.getenv("AF_CACHE_TTL", "5"))
+
+# Databricks
+DATABRICKS_HOST = os.getenv("DATABRICKS_HOST", "").rstrip('/')
+DATABRICKS_TOKEN = os.getenv("DATABRICKS_TOKEN", "")
+
+# Guardrails
+MAX_RERUNS = int(os.getenv("MAX_RERUNS", "2"))
+ALLOWLIST_DAGS = os.getenv("ALLOWLIST_DAGS", "")
+
+# Output
+# Tool results go to the AI, so JSON is compact by default. Set to "true" to indent it.
+MCP_PRETTY_JSON = os.getenv("MCP_PRETTY_JSON", "false").lower() in ("1", "true", "yes")
@@ -1,10 +1,11 @@
+import orjson
 import requests
-import os
+import urllib3
+from requests.adapters import HTTPAdapter
 import logging
 from typing import Dict, Any, Optional
-from dotenv import load_dotenv
+from config import DATABRICKS_HOST, DATABRICKS_TOKEN
 
-load_dotenv()
 logger = logging.getLogger("DatabricksClient")
 
 class DatabricksClient:
@@ -12,10 +13,12 @@ class DatabricksClient:
     This class handles talking to the Databricks API.
     It allows us to check if a Job failed and why.
     """
+    __slots__ = ("host", "token", "headers", "session")
+
     def __init__(self):
         # 1. Load Credentials (Host URL and Secret Token)
-        self.host = os.getenv("DATABRICKS_HOST", "").rstrip('/')
-        self.token = os.getenv("DATABRICKS_TOKEN", "")
+        self.host = DATABRICKS_HOST
+        self.token = DATABRICKS_TOKEN
         
         # Check if they exist (WARN if missing)
         if not self.host or not self.token:
@@ -25,15 +28,43 @@ class DatabricksClient:
         # Bearer Token is standard for Databricks
         self.headers = {"Authorization": f"Bearer {self.token}"}
 
+        # 3. Setup a reusable Session (keeps the connection open between calls)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        # Retry busy/unavailable errors (429/5xx) with exponential backoff + jitter.
+        # Only GETs are retried: a 504 can arrive AFTER a POST was accepted, and
+        # repeating it would start a second run.
+        retry = urllib3.util.Retry(
+            total=5,
+            backoff_factor=0.3,
+            backoff_jitter=0.3,
+            status_forcelist=[429, 502, 503, 504],
+            allowed_methods=["GET"],
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(pool_connections=5, pool_maxsize=20, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Closes the open connections."""
+        self.session.close()
+
     def _post(self, endpoint: str, json_data: Dict) -> Dict:
         """
         Helper: Sends data (POST) to Databricks.
         """
         url = f"{self.host}/api/2.1/{endpoint}"
         try:
-            response = requests.post(url, headers=self.headers, json=json_data, timeout=10)
+            response = self.session.post(url, json=json_data, timeout=10)
             response.raise_for_status()
-            return response.json()
+            return orjson.loads(response.content)
         except requests.exceptions.RequestException as e:
             logger.error(f"Databricks API Error: {e}")
             raise
@@ -45,12 +76,12 @@ class DatabricksClient:
         """
         url = f"{self.host}/api/2.1/jobs/runs/get-output"
         try:
-            response = requests.get(url, headers=self.headers, params={"run_id": run_id}, timeout=10)
+            response = self.session.get(url, params={"run_id": run_id}, timeout=10)
             response.raise_for_status()
-            return response.json()
-        except Exception as e:
+            return orjson.loads(response.content)
+        except requests.exceptions.RequestException as e:
             logger.error(f"Failed to get run output for {run_id}: {e}")
-            return {"error": str(e)}
+            raise
 
     def run_now(self, job_id: int, params: Dict = None) -> Dict[str, Any]:
         """
@@ -69,9 +100,9 @@ class DatabricksClient:
         """
         url = f"{self.host}/api/2.1/jobs/runs/get"
         try:
-            response = requests.get(url, headers=self.headers, params={"run_id": run_id})
+            response = self.session.get(url, params={"run_id": run_id})
             response.raise_for_status()
-            return response.json()
+            return orjson.loads(response.content)
         except Exception as e:
             logger.error(f"Failed to get run info {run_id}: {e}")
             raise
@@ -34,6 +34,26 @@ def demo_scenario_2_oom():
     result = rca.analyze(oom_log)
     print_scenario("Scenario 2 Result", result)
 
+def demo_scenario_3_priority():
+    """
+    Scenario 3: The most important error wins, even inside another match.
+    Does not require API access.
+    """
+    print("\nRunning Scenario 3: Pattern Priority...")
+
+    cases = [
+        # A 'SchemaMismatch' inside a long 'OOM' match
+        ("Total size of serialized results java.lang.OutOfMemoryError "
+         "AnalysisException: cannot resolve is bigger than xxx", "SchemaMismatch"),
+        # A 'Permissions' error inside a long 'DataQuality' match
+        ("NullPointerException in AccessDeniedException handler for input row 42", "Permissions"),
+    ]
+    for log_text, expected in cases:
+        result = rca.analyze(log_text)
+        assert result["root_cause"] == expected, (expected, result)
+        print_scenario(f"Scenario 3 Result (expected {expected})", result)
+
 if __name__ == "__main__":
     demo_scenario_2_oom() # Run local logic test only to avoid connection errors
+    demo_scenario_3_priority()
     # demo_scenario_1_schema_mismatch() # Uncomment to test API integrations
@@ -1,9 +1,8 @@
-import os
 import logging
+import re
+import functools
 from typing import Dict, List, Optional
-from dotenv import load_dotenv
-
-load_dotenv()
+from config import MAX_RERUNS, ALLOWLIST_DAGS
 
 # Configure logging to console
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -15,15 +14,26 @@ class PolicyGuardrails:
     This class prevents the AI from making dangerous mistakes.
     Example: "Don't restart a job 100 times" or "Don't restart if the table is deleted".
     """
+    __slots__ = ("max_reruns", "allowlist_dags", "blocked_actions", "_blocked_re", "_is_allowed_cached")
+
+    # Errors that a simple restart will NOT fix (like Bad Data).
+    UNSAFE_CAUSES = frozenset({"SchemaMismatch", "Permissions", "DataQuality"})
+
     def __init__(self):
         # 1. Max Reruns: How many times can we try again? (Default: 2)
-        self.max_reruns = int(os.getenv("MAX_RERUNS", "2"))
+        self.max_reruns = MAX_RERUNS
         
         # 2. Allowlist: Which pipelines are we allowed to touch?
-        self.allowlist_dags = self._parse_list(os.getenv("ALLOWLIST_DAGS", ""))
+        # (a frozenset, so checking membership is instant)
+        self.allowlist_dags = frozenset(self._parse_list(ALLOWLIST_DAGS))
         
         # 3. Blocked Actions: Things we NEVER do.
-        self.blocked_actions = ["delete", "drop", "truncate"] 
+        self.blocked_actions = ["delete", "drop", "truncate"]
+        # ...all of them as ONE pattern, built once, so check_safety is a single search
+        self._blocked_re = re.compile("|".join(map(re.escape, self.blocked_actions)), re.IGNORECASE)
+
+        # Remember answers for DAGs we've already checked (the allowlist never changes)
+        self._is_allowed_cached = functools.lru_cache(maxsize=512)(self._is_dag_allowed_inner)
 
     def _parse_list(self, env_str: str) -> List[str]:
         """Helper to turn a comma-separated string into a list."""
@@ -36,6 +46,10 @@ class PolicyGuardrails:
         Check: Is this pipeline in our 'Safe List'?
         If the list is empty, we default to blocking EVERYTHING for safety.
         """
+        return self._is_allowed_cached(dag_id)
+
+    def _is_dag_allowed_inner(self, dag_id: str) -> bool:
+        """The actual allowlist check (results are cached by is_dag_allowed)."""
         if not self.allowlist_dags:
             logger.warning("No allowlist configured. Defaulting to DENY ALL (Fail-Closed).")
             return False
@@ -45,26 +59,40 @@ class PolicyGuardrails:
             logger.warning(f"DAG '{dag_id}' blocked by allowlist.")
         return is_allowed
 
-    def validate_rerun(self, dag_id: str, current_try_number: int, rca_root_cause: str) -> Dict:
+    def precheck_rerun(self, dag_id: str, current_try_number: int) -> Dict:
         """
-        The Main Decision Maker.
-        Returns: { "allowed": True/False, "reason": "..." }
+        The cheap checks (Rules 1 and 2) that don't need an RCA.
+        If one of them fails, the rerun is blocked no matter what the root cause is,
+        so the answer includes "hard_block": True.
+        Returns: { "allowed": True/False, "reason": "...", "hard_block": True/False }
         """
         # Rule 1: Is it in the Allowlist?
         if not self.is_dag_allowed(dag_id):
-            return {"allowed": False, "reason": f"DAG '{dag_id}' is not in the allowlist."}
+            return {"allowed": False, "reason": f"DAG '{dag_id}' is not in the allowlist.", "hard_block": True}
 
         # Rule 2: Did we try too many times already?
         if current_try_number > self.max_reruns:
             return {
                 "allowed": False, 
-                "reason": f"Max reruns reached ({current_try_number} > {self.max_reruns})."
+                "reason": f"Max reruns reached ({current_try_number} > {self.max_reruns}).",
+                "hard_block": True
             }
 
+        return {"allowed": True, "reason": "Passed pre-checks.", "hard_block": False}
+
+    def validate_rerun(self, dag_id: str, current_try_number: int, rca_root_cause: str) -> Dict:
+        """
+        The Main Decision Maker.
+        Returns: { "allowed": True/False, "reason": "..." }
+        """
+        # Rules 1 & 2: Allowlist and max reruns
+        precheck = self.precheck_rerun(dag_id, current_try_number)
+        if not precheck["allowed"]:
+            return precheck
+
         # Rule 3: Is the error fixed by a restart?
         # Some errors (like Bad Data) won't get fixed just by running again.
-        unsafe_causes = ["SchemaMismatch", "Permissions", "DataQuality"]
-        if rca_root_cause in unsafe_causes:
+        if rca_root_cause in self.UNSAFE_CAUSES:
             return {
                 "allowed": False,
                 "reason": f"Root cause '{rca_root_cause}' requires manual intervention."
@@ -76,8 +104,7 @@ class PolicyGuardrails:
 
     def check_safety(self, tool_name: str, params: Dict) -> bool:
         """
-        Extra check: Stop any tool that looks like it's deleting things.
+        Extra check: Stop any tool that looks like it's deleting things
+        (its name contains one of the blocked actions).
         """
-        if "delete" in tool_name.lower():
-            return False
-        return True
+        return self._blocked_re.search(tool_name) is None
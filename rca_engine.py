@@ -1,5 +1,19 @@
 import re
-from typing import Dict, Any
+import bisect
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List
+
+# Optional: Hyperscan scans all patterns at once and is much faster on big logs.
+# If it's not installed we just use Python's 're' module.
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+# Placeholder texts returned by AirflowClient when there is no real log
+_SENTINELS = frozenset({"Log not found."})
 
 class RCAEngine:
     """
@@ -7,6 +21,14 @@ class RCAEngine:
     This class scans text logs for known error patterns (like OOM, Permissions, etc.)
     and suggests a fix.
     """
+    __slots__ = (
+        "patterns", "_flat", "_combined", "_hs_db", "_hs_local",
+        "_cache", "_cache_lock"
+    )
+
+    # How many past results we remember (oldest are dropped first)
+    CACHE_SIZE = 256
+
     def __init__(self):
         # Database of known errors (Regex Patterns)
         self.patterns = {
@@ -36,38 +58,186 @@ class RCAEngine:
             ]
         }
 
+        # Compile every pattern once, up front, into one flat list
+        # ordered by priority: [(error_type, compiled_pattern), ...]
+        self._flat = [
+            (error_type, re.compile(p, re.IGNORECASE))
+            for error_type, regex_list in self.patterns.items()
+            for p in regex_list
+        ]
+
+        # One big pattern so the log is scanned only once.
+        # Pattern number i gets a named group "p<i>", which points back into self._flat.
+        self._combined = re.compile(
+            "|".join(f"(?P<p{i}>{rx.pattern})" for i, (_, rx) in enumerate(self._flat)),
+            re.IGNORECASE
+        )
+
+        # Hyperscan database (only if the library is installed).
+        # The pattern id is its position in self._flat.
+        self._hs_db = None
+        if hyperscan is not None:
+            n = len(self._flat)
+            self._hs_db = hyperscan.Database()
+            self._hs_db.compile(
+                expressions=[rx.pattern.encode() for _, rx in self._flat],
+                ids=list(range(n)),
+                elements=n,
+                flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH] * n
+            )
+        # Each thread gets its own Hyperscan scratch memory (two scans can't share one)
+        self._hs_local = threading.local()
+
+        # Cache of past results: hash of the log text -> diagnosis
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
     def analyze(self, log_text: str) -> Dict[str, Any]:
         """
         Main Function:
         Takes a big messy log, finds the needle in the haystack.
         """
-        if not log_text:
-            return {
-                "root_cause": "Unknown",
-                "confidence": "Low",
-                "details": "No logs provided for analysis."
-            }
-
-        # Scan text against all known patterns
-        for error_type, regex_list in self.patterns.items():
-            for pattern in regex_list:
-                match = re.search(pattern, log_text, re.IGNORECASE)
-                if match:
-                    # Found a match! Return the diagnosis.
-                    return {
-                        "root_cause": error_type,
-                        "confidence": "High",
-                        "evidence": match.group(0),
-                        "recommendation": self._recommend(error_type)
-                    }
-        
-        # If no patterns match
+        return self.analyze_batch([log_text])[0]
+
+    def analyze_batch(self, logs: List[str]) -> List[Dict[str, Any]]:
+        """
+        Same as analyze(), but for many logs at once.
+        Logs we've seen before come from the cache; the rest are scanned together.
+        Results come back in the same order as 'logs'.
+        """
+        results = [None] * len(logs)
+        keys = {}     # log position -> cache key
+        pending = []  # log positions that still need a scan
+
+        for i, log_text in enumerate(logs):
+            # Quick exit: nothing worth scanning
+            if not log_text:
+                results[i] = {
+                    "root_cause": "Unknown",
+                    "confidence": "Low",
+                    "details": "No logs provided for analysis."
+                }
+            elif log_text in _SENTINELS or len(log_text) < 32:
+                results[i] = {
+                    "root_cause": "Unknown",
+                    "confidence": "Low",
+                    "details": "Log too short or missing."
+                }
+            else:
+                # Same log as before? Reuse the previous diagnosis.
+                keys[i] = hashlib.blake2b(log_text.encode("utf-8", errors="replace"), digest_size=16).digest()
+                with self._cache_lock:
+                    cached = self._cache.get(keys[i])
+                    if cached is not None:
+                        self._cache.move_to_end(keys[i])
+                        results[i] = dict(cached)
+                        continue
+                pending.append(i)
+
+        # Scan the remaining logs against all known patterns
+        hits = self._search_many([logs[i] for i in pending])
+        for i, (error_type, match) in zip(pending, hits):
+            if match:
+                # Found a match! Remember it and return the diagnosis.
+                result = self._diagnosis(error_type, match)
+                with self._cache_lock:
+                    self._cache[keys[i]] = result
+                    if len(self._cache) > self.CACHE_SIZE:
+                        self._cache.popitem(last=False)
+                results[i] = dict(result)
+            else:
+                # If no patterns match
+                results[i] = {
+                    "root_cause": "Unknown",
+                    "confidence": "Low",
+                    "details": "No specific error pattern matched. Manual review required."
+                }
+        return results
+
+    def _search_many(self, texts: List[str]) -> List[tuple]:
+        """
+        Helper: Finds the most important known error in each text
+        (the one that comes first in self._flat, wherever it is in the log).
+        Returns one (error_type, match) or (None, None) per text.
+        With Hyperscan each text gets its own (very fast) scan. Otherwise the texts
+        are joined and scanned in a single pass, and each match is mapped back
+        to the text it came from.
+        """
+        if self._hs_db is not None:
+            return [self._hs_search(text) for text in texts]
+
+        # Join with newlines: no pattern can match across a line break,
+        # so a match never spans two texts.
+        starts = []
+        offset = 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + 1
+        combined = "\n".join(texts)
+
+        # Best (highest priority) match found so far in each text: (pattern index, match)
+        best = [None] * len(texts)
+        pos = 0
+        while pos < len(combined):
+            match = self._combined.search(combined, pos)
+            if not match:
+                break
+            k = bisect.bisect_right(starts, match.start()) - 1
+            i = int(match.lastgroup[1:])
+            if best[k] is None or i < best[k][0]:
+                best[k] = (i, match)
+            if i == 0:
+                # Nothing beats the top pattern, jump to the start of the next text
+                pos = starts[k + 1] if k + 1 < len(starts) else len(combined)
+            else:
+                # Move on by ONE char, not to match.end(): a long '.*' match could
+                # otherwise hide a more important error that starts inside it.
+                # (At any one position the alternation already picks the lowest index.)
+                pos = match.start() + 1
+
+        return [(self._flat[hit[0]][0], hit[1]) if hit else (None, None) for hit in best]
+
+    def _diagnosis(self, error_type: str, match) -> Dict[str, Any]:
+        """Helper: Builds the answer for a matched error."""
         return {
-            "root_cause": "Unknown", 
-            "confidence": "Low", 
-            "details": "No specific error pattern matched. Manual review required."
+            "root_cause": error_type,
+            "confidence": "High",
+            "evidence": match.group(0),
+            "recommendation": self._recommend(error_type)
         }
 
+    def _hs_search(self, log_text: str):
+        """
+        Helper: Runs the Hyperscan database over the log and keeps the
+        highest-priority hit (lowest pattern id), the same rule as the regex scan in _search_many.
+        Hyperscan only tells us WHICH pattern matched, so we re-run that one
+        pattern with 're' to get the matching text (the evidence).
+        """
+        best = [] # [lowest pattern id seen so far]
+
+        def on_match(pattern_id, start, end, flags, context):
+            if not best or pattern_id < best[0]:
+                best[:] = [pattern_id]
+            return pattern_id == 0  # Stop scanning: nothing beats the top pattern
+
+        scratch = getattr(self._hs_local, "scratch", None)
+        if scratch is None:
+            scratch = self._hs_local.scratch = hyperscan.Scratch(self._hs_db)
+
+        try:
+            self._hs_db.scan(
+                log_text.encode("utf-8", errors="replace"),
+                match_event_handler=on_match,
+                scratch=scratch
+            )
+        except hyperscan.ScanTerminated:
+            pass # We stopped it ourselves after hitting the top pattern
+        if not best:
+            return None, None
+
+        error_type, rx = self._flat[best[0]]
+        return error_type, rx.search(log_text)
+
     def _recommend(self, error_type: str) -> str:
         """
         Returns a human-readable suggestion based on the error type.
@@ -147,6 +147,22 @@ async def list_tools() -> list[types.Tool]:
         )
     ]
 
+# ==============================================================================
+# TOOL ROUTING
+# Maps each tool name to the function in tools.py that runs it.
+# ==============================================================================
+_TOOL_DISPATCH = {
+    "airflow_get_dag_run": lambda a: tools.airflow_get_dag_run(a["dag_id"], a["run_id"]),
+    "airflow_get_failed_tasks": lambda a: tools.airflow_get_failed_tasks(a["dag_id"], a["run_id"]),
+    "airflow_get_task_log": lambda a: tools.airflow_get_task_log(a["dag_id"], a["run_id"], a["task_id"]),
+    # This is the new helper tool we added for production
+    "airflow_extract_databricks_run_id": lambda a: tools.airflow_extract_databricks_run_id(a["dag_id"], a["run_id"], a["task_id"]),
+    "dbx_get_run_output": lambda a: tools.dbx_get_run_output(int(a["run_id"])),
+    "dbx_run_now": lambda a: tools.dbx_run_now(int(a["job_id"]), a.get("params")),
+    "generate_rca": lambda a: tools.generate_rca(a["dag_id"], a["run_id"]),
+    "rerun_failed_pipeline": lambda a: tools.rerun_failed_pipeline(a["dag_id"], a["run_id"], a.get("mode", "failed_only")),
+}
+
 # ==============================================================================
 # TOOL EXECUTION
 # When the AI asks to run a tool, this function runs it.
@@ -160,26 +176,13 @@ async def call_tool(name: str, arguments: Any) -> list[types.TextContent | types
     logger.info(f"Calling tool: {name} with args: {arguments}")
     
     try:
-        # Route the request to the correct function in tools.py
-        if name == "airflow_get_dag_run":
-            result = tools.airflow_get_dag_run(arguments["dag_id"], arguments["run_id"])
-        elif name == "airflow_get_failed_tasks":
-            result = tools.airflow_get_failed_tasks(arguments["dag_id"], arguments["run_id"])
-        elif name == "airflow_get_task_log":
-            result = tools.airflow_get_task_log(arguments["dag_id"], arguments["run_id"], arguments["task_id"])
-        elif name == "airflow_extract_databricks_run_id":
-            # This is the new helper tool we added for production
-            result = tools.airflow_extract_databricks_run_id(arguments["dag_id"], arguments["run_id"], arguments["task_id"])
-        elif name == "dbx_get_run_output":
-            result = tools.dbx_get_run_output(int(arguments["run_id"]))
-        elif name == "dbx_run_now":
-            result = tools.dbx_run_now(int(arguments["job_id"]), arguments.get("params"))
-        elif name == "generate_rca":
-            result = tools.generate_rca(arguments["dag_id"], arguments["run_id"])
-        elif name == "rerun_failed_pipeline":
-            result = tools.rerun_failed_pipeline(arguments["dag_id"], arguments["run_id"], arguments.get("mode", "failed_only"))
-        else:
+        # Route the request to the correct function in tools.py.
+        # The tools make blocking HTTP calls, so they run in a worker thread
+        # to keep the server responsive to other requests.
+        handler = _TOOL_DISPATCH.get(name)
+        if handler is None:
             raise ValueError(f"Unknown tool: {name}")
+        result = await asyncio.to_thread(handler, arguments)
 
         # Return the result as text to the AI
         return [types.TextContent(type="text", text=str(result))]
@@ -1,12 +1,29 @@
 import logging
 import re
-import json
+import threading
+from functools import lru_cache, wraps
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 from typing import Dict, Any, List, Optional
 
+# Optional: Google's RE2 engine guarantees linear-time matching on huge logs.
+# If it's not installed we just use Python's 're' module (same API).
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+# Optional: Hyperscan checks all Run ID patterns in one (SIMD-accelerated) pass.
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
 from airflow_client import AirflowClient
 from databricks_client import DatabricksClient
 from rca_engine import RCAEngine
 from policy import PolicyGuardrails
+from config import MCP_PRETTY_JSON
 
 # ==============================================================================
 # TOOLS ORCHESTRATION
@@ -21,42 +38,162 @@ databricks = DatabricksClient()
 rca = RCAEngine()
 policy = PolicyGuardrails()
 
+# How many tasks generate_rca works on at the same time
+_MAX_WORKERS = 8
+
+# Patterns that find the Databricks 'Run ID' in a log.
+# None of them can cross a line break, so a log can be scanned line by line (or piece by piece).
+_RUN_ID_PATTERNS = [
+    r"run[_ ]?id[=: ]+(\d+)",                                   # matches "run_id=123" and "Run ID: 123"
+    r"Submitted run[^\d\n]*(\d+)",                              # matches "Submitted run 123"
+    r"databricks run now response.*?run_id[\"':\t ]+(\d+)",     # matches JSON response
+]
+
+# All of them as one pattern (compiled once, at import).
+# Each alternative has its own group; the one that matched holds the number.
+# (Case-insensitivity is set inline with "(?i)" because RE2 doesn't take 're' flags.)
+_RUN_ID_RE = (re2 if re2 is not None else re).compile("(?i)" + "|".join(_RUN_ID_PATTERNS))
+
+# Hyperscan version of the same patterns (only if the library is installed).
+# We only need to know where matches END, so no start-of-match tracking is asked for.
+_RUN_ID_HS_DB = None
+if hyperscan is not None:
+    _RUN_ID_HS_DB = hyperscan.Database()
+    _RUN_ID_HS_DB.compile(
+        expressions=[p.encode() for p in _RUN_ID_PATTERNS],
+        ids=list(range(len(_RUN_ID_PATTERNS))),
+        elements=len(_RUN_ID_PATTERNS),
+        flags=[hyperscan.HS_FLAG_CASELESS] * len(_RUN_ID_PATTERNS)
+    )
+
+# Hyperscan needs its own 'scratch' memory per scan, and tools run in many threads
+# at once. So every thread gets its own scratch (made the first time it scans).
+_RUN_ID_HS_LOCAL = threading.local()
+
+# What the Airflow client returns instead of a log when something went wrong.
+# These messages are short and always at the START, so we only look at the head.
+_ERR_RE = re.compile(r"\AError|Log not found")
+_ERR_HEAD = 256
+
+def _dumps(obj: Any, pretty: bool = False) -> str:
+    """
+    HELPER FUNCTION:
+    Turns a Python object into a JSON string (using the fast 'orjson' library).
+    pretty=True adds indentation so humans can read it (see MCP_PRETTY_JSON).
+    """
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0).decode()
+
+def _json_tool(fn):
+    """
+    DECORATOR:
+    Turns a function that returns Python objects into a tool that returns JSON.
+    If the function raises, the tool returns {"error": "..."} instead.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return _dumps(fn(*args, **kwargs))
+        except Exception as e:
+            return _dumps({"error": str(e)})
+    return wrapper
+
+# How much of the END of a log we check first for the Run ID (8 KB)
+_RUN_ID_TAIL_WINDOW = 8192
+# When scanning a log in pieces, the unfinished last line of a piece is scanned
+# again with the next piece. This caps how much of it we keep (for huge lines).
+_RUN_ID_STREAM_CARRY = 64 * 1024
+
 def _extract_run_id(log_text: str) -> Optional[int]:
     """
     HELPER FUNCTION:
     This looks at a text log and finds the Databricks 'Run ID'.
     It uses 'Regex' (pattern matching) to find numbers like: "Run ID: 12345".
+    If the log mentions several runs (e.g. retries), the LAST one wins.
+
+    The ID is usually printed near the end of the log, so we look at the
+    last few KB first and only scan the whole log if it isn't there.
     """
-    patterns = [
-        r"run_id[=: ]+(\d+)",                         # matches "run_id=123"
-        r"Run ID[=: ]+(\d+)",                         # matches "Run ID: 123"
-        r"Submitted run[^\d]*(\d+)",                  # matches "Submitted run 123"
-        r"databricks run now response.*run_id[\"':\s]+(\d+)" # matches JSON response
-    ]
-    for p in patterns:
-        match = re.search(p, log_text, re.IGNORECASE)
-        if match:
-            return int(match.group(1)) # We found it! Return the number.
+    if len(log_text) > _RUN_ID_TAIL_WINDOW:
+        # Start the window at a line break, so its first line isn't cut in half
+        cut = log_text.find("\n", len(log_text) - _RUN_ID_TAIL_WINDOW)
+        if cut != -1:
+            run_id = _last_run_id(log_text[cut + 1:])
+            if run_id is not None:
+                return run_id
+    return _last_run_id(log_text)
+
+def _last_run_id(text: str) -> Optional[int]:
+    """Helper: Returns the last Run ID found in 'text' (or None)."""
+    # Fast path: most logs say "Submitted run 123". A plain text search finds the
+    # last one quickly; then we only need to scan from the start of its line.
+    start = text.rfind("Submitted run ")
+    if start > 0:
+        start = text.rfind("\n", 0, start) + 1
+    if start > 0:
+        run_id = _last_run_id(text[start:])
+        if run_id is not None:
+            return run_id
+
+    if _RUN_ID_HS_DB is not None:
+        return _last_run_id_hs(text)
+    return _last_run_id_re(text)
+
+def _last_run_id_re(text: str) -> Optional[int]:
+    """Helper: Same as _last_run_id, using the normal regex only."""
+    match = None
+    for match in _RUN_ID_RE.finditer(text):
+        pass # Keep going until the last match
+    if match:
+        return int(match.group(match.lastindex)) # lastindex = the group of the pattern that matched
     return None # We didn't find any ID.
 
+def _last_run_id_hs(text: str) -> Optional[int]:
+    """
+    Helper: Same as _last_run_id, but scans with Hyperscan.
+    Hyperscan only tells us WHERE the last match is, so we run the normal
+    regex on just that line to read the number. (The patterns never cross a
+    line break, so the regex gives the same answer there as on the whole text.)
+    """
+    data = text.encode("utf-8", errors="replace")
+    last = [] # [end] of the match that ends last
+
+    def on_match(pattern_id, start, end, flags, context):
+        if not last or end > last[0]:
+            last[:] = [end]
+
+    scratch = getattr(_RUN_ID_HS_LOCAL, "scratch", None)
+    if scratch is None:
+        scratch = _RUN_ID_HS_LOCAL.scratch = hyperscan.Scratch(_RUN_ID_HS_DB)
+    _RUN_ID_HS_DB.scan(data, match_event_handler=on_match, scratch=scratch)
+    if not last:
+        return None # We didn't find any ID.
+
+    # Cut out the whole line the match is on; it can hold more than one ID, so take its LAST one
+    line_start = data.rfind(b"\n", 0, last[0]) + 1
+    line_end = data.find(b"\n", last[0])
+    line = data[line_start:line_end if line_end != -1 else len(data)]
+    return _last_run_id_re(line.decode("utf-8", errors="replace"))
+
 # ------------------------------------------------------------------------------
 # AIRFLOW TOOLS
 # ------------------------------------------------------------------------------
 
-def airflow_get_dag_run(dag_id: str, run_id: str) -> str:
+@_json_tool
+def airflow_get_dag_run(dag_id: str, run_id: str) -> Dict[str, Any]:
     """Tool: Get details about a specific Pipeline run."""
+    return airflow.get_dag_run(dag_id, run_id)
+
+def _airflow_get_failed_tasks(dag_id: str, run_id: str) -> List[Dict[str, Any]]:
+    """Finds WHICH tasks failed (as Python objects, not JSON)."""
     try:
-        # Ask Airflow Client for data, convert to JSON string
-        return json.dumps(airflow.get_dag_run(dag_id, run_id))
+        return airflow.get_failed_tasks(dag_id, run_id)
     except Exception as e:
-        return json.dumps({"error": str(e)})
+        return [{"error": str(e)}]
 
-def airflow_get_failed_tasks(dag_id: str, run_id: str) -> str:
+@_json_tool
+def airflow_get_failed_tasks(dag_id: str, run_id: str) -> List[Dict[str, Any]]:
     """Tool: Find out WHICH tasks failed."""
-    try:
-        return json.dumps(airflow.get_failed_tasks(dag_id, run_id))
-    except Exception as e:
-        return json.dumps([{"error": str(e)}])
+    return _airflow_get_failed_tasks(dag_id, run_id)
 
 def airflow_get_task_log(dag_id: str, run_id: str, task_id: str) -> str:
     """
@@ -64,28 +201,37 @@ def airflow_get_task_log(dag_id: str, run_id: str, task_id: str) -> str:
     We return a 'Cleaned' version that includes metadata.
     """
     try:
-        # 1. Fetch text from Airflow
-        log_text = airflow.get_task_log(dag_id, run_id, task_id, 1)
-        
-        # 2. Check for basic errors
-        if log_text.startswith("Error") or "Log not found" in log_text:
-             return json.dumps({"error": log_text})
+        # 1. Fetch text from Airflow, piece by piece.
+        # We never hold the whole log: just the Run ID seen so far and the last 2000 chars.
+        tail = ""
+        carry = "" # unfinished last line of the previous piece, in case a Run ID is split between pieces
+        dbx_run_id = None
+        for i, chunk in enumerate(airflow.get_task_log_stream(dag_id, run_id, task_id, 1)):
+            # 2. Check for basic errors
+            if i == 0 and _ERR_RE.search(chunk[:_ERR_HEAD]):
+                return _dumps({"error": chunk})
 
-        # 3. Try to be smart and find the Databricks ID immediately
-        dbx_run_id = _extract_run_id(log_text)
+            # 3. Try to be smart and find the Databricks ID (the last one wins)
+            window = carry + chunk
+            found = _last_run_id(window)
+            if found is not None:
+                dbx_run_id = found
+            carry = window[window.rfind("\n") + 1:][-_RUN_ID_STREAM_CARRY:]
+
+            # 4. Keep only the last 2000 chars so we don't overwhelm the AI
+            tail = (tail + chunk)[-2000:]
         
-        # 4. Build a nice JSON response
+        # 5. Build a nice JSON response
         response = {
             "dag_id": dag_id,
             "task_id": task_id,
             "run_id": run_id,
             "databricks_run_id": dbx_run_id,
-            # Return only the last 2000 chars so we don't overwhelm the AI
-            "log_content": log_text[-2000:] if len(log_text) > 2000 else log_text
+            "log_content": tail
         }
-        return json.dumps(response, indent=2)
+        return _dumps(response, pretty=MCP_PRETTY_JSON)
     except Exception as e:
-        return json.dumps({"error": str(e)})
+        return _dumps({"error": str(e)})
 
 def airflow_extract_databricks_run_id(dag_id: str, run_id: str, task_id: str) -> Optional[int]:
     """
@@ -93,40 +239,56 @@ def airflow_extract_databricks_run_id(dag_id: str, run_id: str, task_id: str) ->
     Useful if the AI wants to double-check a specific task.
     """
     try:
-        log_text = airflow.get_task_log(dag_id, run_id, task_id, 1)
-        return _extract_run_id(log_text)
+        return _get_dbx_run_id(dag_id, run_id, task_id, 1)
     except Exception as e:
         logger.error(f"Extraction failed: {e}")
         return None
 
+@lru_cache(maxsize=512)
+def _get_dbx_run_id(dag_id: str, run_id: str, task_id: str, try_number: int) -> int:
+    """
+    HELPER FUNCTION:
+    Fetches a task's log and finds the Databricks ID.
+    The answer is remembered, so asking about the same task again is free.
+    (If the log can't be fetched, or has no ID yet, we raise, so those are NOT
+    remembered: a task that is still running may print its ID later.)
+    """
+    log_text = airflow.get_task_log(dag_id, run_id, task_id, try_number)
+    if _ERR_RE.search(log_text[:_ERR_HEAD]):
+        raise LookupError(log_text)
+    dbx_run_id = _extract_run_id(log_text)
+    if dbx_run_id is None:
+        raise LookupError("No Databricks Run ID in the log (yet).")
+    return dbx_run_id
+
 # ------------------------------------------------------------------------------
 # DATABRICKS TOOLS
 # ------------------------------------------------------------------------------
 
-def dbx_get_run_output(run_id: int) -> str:
+@_json_tool
+def dbx_get_run_output(run_id: int) -> Dict[str, Any]:
     """Tool: Get the error message from Databricks."""
-    try:
-        return json.dumps(databricks.get_run_output(run_id))
-    except Exception as e:
-        return json.dumps({"error": str(e)})
+    return databricks.get_run_output(run_id)
 
-def dbx_run_now(job_id: int, params: Dict = None) -> str:
+@_json_tool
+def dbx_run_now(job_id: int, params: Dict = None) -> Dict[str, Any]:
     """Tool: Trigger a Job (Run a notebook)."""
     # SAFETY CHECK: Is this safe?
     if not policy.check_safety("dbx_run_now", params):
-         return json.dumps({"error": "Action blocked by safety policy."})
-    try:
-        return json.dumps(databricks.run_now(job_id, params))
-    except Exception as e:
-        return json.dumps({"error": str(e)})
+        return {"error": "Action blocked by safety policy."}
+    return databricks.run_now(job_id, params)
 
 # ------------------------------------------------------------------------------
 # INTELLIGENT WORKFLOWS (The "Agent" Logic)
 # ------------------------------------------------------------------------------
 
 def generate_rca(dag_id: str, run_id: str) -> str:
+    """Tool: The "Magic Button". Runs the full RCA (see _generate_rca)."""
+    return _dumps(_generate_rca(dag_id, run_id), pretty=MCP_PRETTY_JSON)
+
+def _generate_rca(dag_id: str, run_id: str) -> Dict[str, Any]:
     """
-    Tool: The "Magic Button".
+    Builds the RCA report (as Python objects, not JSON).
     It:
     1. Finds failed tasks
     2. Reads their logs
@@ -135,81 +297,110 @@ def generate_rca(dag_id: str, run_id: str) -> str:
     5. Analyzes everything to find the Root Cause
     """
     # 1. Get failed tasks
-    failed_tasks_list = airflow_get_failed_tasks(dag_id, run_id)
-    failed_tasks = json.loads(failed_tasks_list)
+    failed_tasks = _airflow_get_failed_tasks(dag_id, run_id)
 
-    if not failed_tasks or (isinstance(failed_tasks, list) and len(failed_tasks) > 0 and "error" in failed_tasks[0]):
-        return json.dumps({"status": "No failed tasks found."})
+    if not failed_tasks:
+        return {"status": "No failed tasks found."}
+    if "error" in failed_tasks[0]:
+        return {"error": failed_tasks[0]["error"]}
 
     report = {"dag_id": dag_id, "run_id": run_id, "tasks": []}
 
-    for task in failed_tasks:
-        t_id = task["task_id"]
-        try_num = task["try_number"]
-        
+    def _collect(task):
+        """Steps 2-3 for ONE task. Returns (af_log, db_run_id)."""
         # 2. Get Airflow Log
-        af_log = airflow.get_task_log(dag_id, run_id, t_id, try_num)
-        
+        af_log = airflow.get_task_log(dag_id, run_id, task["task_id"], task["try_number"])
+        # 3. Find Databricks ID
+        return af_log, _extract_run_id(af_log)
+
+    def _get_output(db_run_id):
+        """Step 4 for ONE Databricks run. Returns the output, or the error if it failed."""
+        try:
+            return databricks.get_run_output(db_run_id)
+        except Exception as e:
+            logger.warning(f"Could not fetch Databricks output for run {db_run_id}: {e}")
+            return e
+
+    # Steps 2-4 are just waiting on the network, so do all tasks at the same time
+    with ThreadPoolExecutor(max_workers=min(_MAX_WORKERS, len(failed_tasks))) as executor:
+        collected = list(executor.map(_collect, failed_tasks))
+
+        # 4. Get Databricks Output: each distinct run once, all at the same time
+        db_run_ids = list(dict.fromkeys(db_run_id for _, db_run_id in collected if db_run_id))
+        outputs = dict(zip(db_run_ids, executor.map(_get_output, db_run_ids)))
+
+    log_contexts = []
+    for task, (af_log, db_run_id) in zip(failed_tasks, collected):
         task_analysis = {
-            "task_id": t_id,
+            "task_id": task["task_id"],
             "root_cause_analysis": None
         }
 
-        # 3. Find Databricks ID
-        db_run_id = _extract_run_id(af_log)
-        
         log_context = af_log
         if db_run_id:
             task_analysis["databricks_run_id"] = db_run_id
-            
-            # 4. Get Databricks Output
-            db_out = dbx_get_run_output(db_run_id)
-            db_out_dict = json.loads(db_out)
 
-            error_trace = db_out_dict.get("error_trace", "") or db_out_dict.get("error", "")
-            log_context += f"\n--- Databricks Error ---\n{error_trace}"
-        
-        # 5. Analyze (RCA)
-        rca_result = rca.analyze(log_context)
-        task_analysis["root_cause_analysis"] = rca_result
+            # If Databricks couldn't be reached, analyze the Airflow log alone
+            db_out = outputs[db_run_id]
+            if isinstance(db_out, Exception):
+                task_analysis["databricks_error"] = str(db_out)
+            else:
+                error_trace = db_out.get("error_trace", "") or db_out.get("error", "")
+                # (one join = one new string, instead of building the header and then copying the log)
+                log_context = "".join((af_log, "\n--- Databricks Error ---\n", error_trace))
+
         report["tasks"].append(task_analysis)
+        log_contexts.append(log_context)
 
-    return json.dumps(report, indent=2)
+    # 5. Analyze (RCA) - all tasks in one pass
+    for task_analysis, rca_result in zip(report["tasks"], rca.analyze_batch(log_contexts)):
+        task_analysis["root_cause_analysis"] = rca_result
+
+    return report
 
 def rerun_failed_pipeline(dag_id: str, run_id: str, mode: str = "failed_only") -> str:
     """
     Tool: Auto-Heal.
     Attempts to rerun. But strictly CHECKS POLICY first.
     """
-    # 1. Analyze failure first
-    rca_report_str = generate_rca(dag_id, run_id)
-    rca_report = json.loads(rca_report_str)
+    current_try = 1 # In real app, get this from Airflow
+
+    # 1. Quick policy check first: if the DAG can't be rerun anyway
+    #    (not allowlisted / too many retries), skip the expensive RCA.
+    precheck = policy.precheck_rerun(dag_id, current_try)
+    if precheck["hard_block"]:
+        return _dumps({
+            "status": "Rerun Blocked",
+            "reason": precheck["reason"]
+        })
+
+    # 2. Analyze failure
+    rca_report = _generate_rca(dag_id, run_id)
     
-    # 2. Check if it's safe to rerun (Policy)
+    # 3. Check if it's safe to rerun (Policy)
     tasks = rca_report.get("tasks", [])
     if not tasks:
-        return json.dumps({"status": "Nothing to rerun."})
+        return _dumps({"status": "Nothing to rerun."})
 
     for task in tasks:
         rca_res = task["root_cause_analysis"]
         root_cause = rca_res.get("root_cause", "Unknown")
         
         # Check Policy Class
-        current_try = 1 # In real app, get this from Airflow
         validation = policy.validate_rerun(dag_id, current_try, root_cause)
         
         if not validation["allowed"]:
             # BLOCKED!
-            return json.dumps({
+            return _dumps({
                 "status": "Rerun Blocked",
                 "reason": validation["reason"],
                 "task_id": task["task_id"]
             })
 
-    # 3. If safe, Trigger Rerun
+    # 4. If safe, Trigger Rerun
     logger.info(f"Rerun allowed for {dag_id}. Triggering...")
     try:
         res = airflow.trigger_dag_run(dag_id, conf={"rerun_initiator": "mcp_agent", "original_run": run_id})
-        return json.dumps({"status": "Rerun Triggered", "new_run_details": res})
+        return _dumps({"status": "Rerun Triggered", "new_run_details": res})
     except Exception as e:
-        return json.dumps({"error": f"Failed to trigger rerun: {e}"})
+        return _dumps({"error": f"Failed to trigger rerun: {e}"})